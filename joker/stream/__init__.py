@@ -2,4 +2,4 @@
 
 from joker.stream.base import Stream, FilteredStream, GeneralStream
 
-__version__ = '0.4.2'
+__version__ = '0.5.0'
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+# coding: utf-8
+"""
+Loops applying chains of filters to lines.
+
+Kept apart from shell.py, with full annotations,
+so that it can be compiled with mypyc (see setup.py).
+"""
+
+from typing import Any, Callable, Iterable, Iterator, List
+
+# a line is str or bytes; a filter returns None to discard it
+FilterFunc = Callable[[Any], Any]
+
+
+def is_total(f: FilterFunc) -> bool:
+    """Tell whether a filter is declared to never discard a line"""
+    return bool(getattr(f, 'is_total', False))
+
+
+def map_lines(filters: List[FilterFunc], lines: Iterable[Any]) \
+        -> Iterator[Any]:
+    """Apply filters which never discard a line, with no Python loop"""
+    for f in filters:
+        lines = map(f, lines)
+    return iter(lines)
+
+
+def filter_lines(filters: List[FilterFunc], lines: Iterable[Any]) \
+        -> Iterator[Any]:
+    for line in lines:
+        for f in filters:
+            line = f(line)
+            if line is None:
+                break
+        else:
+            yield line
+
+
+def filter_batches(filters: List[FilterFunc],
+                   batches: Iterable[List[Any]]) -> Iterator[Any]:
+    for batch in batches:
+        for f in filters:
+            if is_total(f):
+                batch = list(map(f, batch))
+            else:
+                batch = [line for line in map(f, batch) if line is not None]
+        yield from batch
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+# coding: utf-8
+"""
+Optional backends which scan a line once for a run of grep/ungrep patterns.
+
+Hyperscan (pip install hyperscan) is preferred,
+RE2 (pip install google-re2) is used if Hyperscan is absent.
+A run with patterns which neither backend can compile is left to `re`.
+
+Passing a line to a backend costs about a microsecond,
+so shorter runs than MIN_PATTERNS are also left to `re`.
+
+The backends are imported on the first run long enough to use them,
+and the scanner of each run is cached.
+"""
+
+import functools
+import re
+
+hyperscan = None
+re2 = None
+_loaded = False
+
+MIN_PATTERNS = 4
+
+_supported_flags = re.IGNORECASE | re.MULTILINE | re.DOTALL | re.UNICODE
+
+_re2_ascii_classes = re.compile(r'\\[dDwWsSbB]')
+
+
+def _search_each(tests, line):
+    # the re equivalent of a scanner, for lines it cannot encode
+    for cre, positive in tests:
+        if (cre.search(line) is not None) != positive:
+            return
+    return line
+
+
+class _HyperscanScanner(object):
+    __slots__ = ('db', 'wanted', 'binary', 'tests', 'matched')
+
+    def __init__(self, db, wanted, binary, tests):
+        self.db = db
+        self.wanted = wanted
+        self.binary = binary
+        self.tests = tests
+        self.matched = 0
+
+    def _on_match(self, id_, start, end, flags, context):
+        self.matched |= 1 << id_
+
+    def __call__(self, line):
+        if self.binary:
+            data = line
+        else:
+            try:
+                data = line.encode('utf-8')
+            except UnicodeEncodeError:
+                # e.g. lone surrogates from errors='surrogateescape'
+                return _search_each(self.tests, line)
+        self.matched = 0
+        self.db.scan(data, match_event_handler=self._on_match)
+        if self.matched == self.wanted:
+            return line
+
+
+class _RE2Scanner(object):
+    __slots__ = ('match', 'wanted', 'tests')
+
+    def __init__(self, match, wanted, tests):
+        self.match = match
+        self.wanted = wanted
+        self.tests = tests
+
+    def __call__(self, line):
+        try:
+            matched = self.match(line)
+        except UnicodeEncodeError:
+            return _search_each(self.tests, line)
+        if frozenset(matched or ()) == self.wanted:
+            return line
+
+
+def _load_backends():
+    global hyperscan, re2, _loaded
+    if _loaded:
+        return
+    _loaded = True
+    try:
+        import hyperscan
+    except ImportError:
+        pass
+    try:
+        import re2  # type: ignore
+    except ImportError:
+        pass
+
+
+def _compile_hyperscan(patterns, flags, wanted, binary, tests):
+    # unlike re, Hyperscan matches \Z before a trailing newline
+    if any(('\\Z' if not binary else b'\\Z') in p for p in patterns):
+        return
+    hs_flags = []
+    for flg in flags:
+        hsf = hyperscan.HS_FLAG_SINGLEMATCH | hyperscan.HS_FLAG_ALLOWEMPTY
+        if flg & re.IGNORECASE:
+            hsf |= hyperscan.HS_FLAG_CASELESS
+        if flg & re.MULTILINE:
+            hsf |= hyperscan.HS_FLAG_MULTILINE
+        if flg & re.DOTALL:
+            hsf |= hyperscan.HS_FLAG_DOTALL
+        if not binary:
+            hsf |= hyperscan.HS_FLAG_UTF8 | hyperscan.HS_FLAG_UCP
+        hs_flags.append(hsf)
+    if not binary:
+        patterns = [p.encode('utf-8') for p in patterns]
+    db = hyperscan.Database(mode=hyperscan.HS_MODE_BLOCK)
+    try:
+        db.compile(
+            expressions=patterns, ids=list(range(len(patterns))),
+            elements=len(patterns), flags=hs_flags,
+        )
+    except hyperscan.error:
+        return
+    mask = sum(1 << i for i in wanted)
+    return _HyperscanScanner(db, mask, binary, tests)
+
+
+def _compile_re2(patterns, flags, wanted, binary, tests):
+    # unlike re, RE2 does not match $ before a trailing newline
+    if any(('$' if not binary else b'$') in p for p in patterns):
+        return
+    # and its \d, \w, \s and \b are ASCII-only, unlike those of str patterns
+    if not binary and any(_re2_ascii_classes.search(p) for p in patterns):
+        return
+    options = re2.Options()
+    options.log_errors = False
+    reset = re2.Set.SearchSet(options)
+    try:
+        for pattern, flg in zip(patterns, flags):
+            inline = ''
+            if flg & re.IGNORECASE:
+                inline += 'i'
+            if flg & re.MULTILINE:
+                inline += 'm'
+            if flg & re.DOTALL:
+                inline += 's'
+            if inline:
+                inline = '(?{})'.format(inline)
+                if binary:
+                    inline = inline.encode('ascii')
+                pattern = inline + pattern
+            reset.Add(pattern)
+        reset.Compile()
+    except re2.error:
+        return
+    return _RE2Scanner(reset.Match, frozenset(wanted), tests)
+
+
+def compile_scanner(tests):
+    """
+    Compile a run of grep/ungrep tests into a single scanner
+
+    :param tests: a list of (compiled_pattern, should_match) pairs
+    :return: a filter returning the line if every pattern with
+        should_match=True matches and no other pattern matches,
+        or None if no backend is available or can compile the patterns
+    """
+    if len(tests) < MIN_PATTERNS:
+        return
+    key = tuple((cre.pattern, cre.flags, positive) for cre, positive in tests)
+    return _compile_scanner(key)
+
+
+@functools.lru_cache(maxsize=256)
+def _compile_scanner(key):
+    patterns = [pattern for pattern, _, _ in key]
+    flags = [flg for _, flg, _ in key]
+    wanted = [i for i, (_, _, positive) in enumerate(key) if positive]
+    binary = isinstance(patterns[0], bytes)
+    if any(isinstance(p, bytes) != binary for p in patterns):
+        return
+    if any(flg & ~_supported_flags for flg in flags):
+        return
+    # both backends read {,n} as literal text and [:alpha:] in a set
+    # as a POSIX class, unlike re; an escaped '{,' is rejected too
+    lbrace, lbracket = ('{,', '[:') if not binary else (b'{,', b'[:')
+    if any(lbrace in p or lbracket in p for p in patterns):
+        return
+    tests = tuple((re.compile(p, flg), positive) for p, flg, positive in key)
+    _load_backends()
+    if hyperscan is not None:
+        scanner = _compile_hyperscan(patterns, flags, wanted, binary, tests)
+        if scanner is not None:
+            return scanner
+    if re2 is not None:
+        return _compile_re2(patterns, flags, wanted, binary, tests)
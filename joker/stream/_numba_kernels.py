@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# coding: utf-8
+"""
+Optional Numba kernels (pip install numba) for byte streams.
+
+Numba is imported on the first call of `is_available()`;
+if it returns False, callers should take the pure Python path.
+Importing and loading the kernel take a few hundred milliseconds,
+so it is used only for files of at least MIN_SIZE bytes.
+"""
+
+import itertools
+
+from joker.stream.base import _iter_line_blocks
+
+numba = None
+numpy = None
+
+# None until is_available() is first called
+available = None
+
+MIN_SIZE = 1 << 26
+
+
+def _nonblank_mask(buf):
+    count = 1
+    for i in range(buf.shape[0]):
+        if buf[i] == 10:
+            count += 1
+    mask = numpy.zeros(count, numpy.bool_)
+    k = 0
+    for i in range(buf.shape[0]):
+        c = buf[i]
+        if c == 10:
+            k += 1
+        # characters of bytes.isspace(): b' \t\n\r\x0b\x0c'
+        elif not (c == 32 or 9 <= c <= 13):
+            mask[k] = True
+    return mask
+
+
+def is_available():
+    global numba, numpy, available
+    if available is None:
+        try:
+            import numba
+            import numpy
+        except ImportError:
+            available = False
+        else:
+            available = _compile()
+    return available
+
+
+def _compile():
+    global _nonblank_mask
+    kernel = numba.njit(cache=True)(_nonblank_mask)
+    # njit compiles on the first call, so that failures surface here
+    try:
+        kernel(numpy.zeros(1, numpy.uint8))
+    except Exception:
+        return False
+    _nonblank_mask = kernel
+    return True
+
+
+def split_nonblank(data):
+    """
+    Equivalent to `[s for s in data.split(b'\\n') if s.strip()]`
+    """
+    mask = _nonblank_mask(numpy.frombuffer(data, dtype=numpy.uint8))
+    return list(itertools.compress(data.split(b'\n'), mask.tolist()))
+
+
+def iter_nonblank_batches(chunks):
+    """
+    Iterate over lists of non-blank lines, without line endings,
+    split from a sequence of byte chunks
+    """
+    for block in _iter_line_blocks(chunks):
+        yield split_nonblank(block)
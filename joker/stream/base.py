@@ -1,15 +1,38 @@
 #!/usr/bin/env python3
 # coding: utf-8
 
-from __future__ import unicode_literals, print_function
-
 import io
+import itertools
 import sys
-import weakref
+
+
+def _iter_line_blocks(chunks):
+    """
+    Regroup byte chunks into blocks of whole lines;
+    each block but the last ends with b'\\n'
+    """
+    # pieces of an unfinished line, joined once its newline arrives
+    pieces = []
+    for chunk in chunks:
+        cut = chunk.rfind(b'\n') + 1
+        if not cut:
+            pieces.append(chunk)
+            continue
+        block = chunk if cut == len(chunk) else chunk[:cut]
+        if pieces:
+            pieces.append(block)
+            block = b''.join(pieces)
+            pieces = []
+        if cut < len(chunk):
+            pieces.append(chunk[cut:])
+        yield block
+    if pieces:
+        yield b''.join(pieces)
 
 
 class Stream(object):
-    all_opened_files = weakref.WeakValueDictionary()
+    # whether the file was opened by Stream.open() and is closed on exit
+    _owns = False
     _preopened = {
         (1, 'w'): sys.stdout,
         (2, 'w'): sys.stderr,
@@ -21,16 +44,30 @@ class Stream(object):
         ('<stdout>', 'w'): sys.stdout,
         ('<stderr>', 'w'): sys.stderr,
     }
-    _safe_attributes = {'mode', 'name'}
+    # bound to the instance, bypassing __getattr__ on each access,
+    # unless the class (e.g. a subclass) defines its own
+    _delegated_methods = ('read', 'readline', 'write', 'flush', 'close')
+    # names of file attributes and methods to bind to instances,
+    # recomputed for each subclass
+    _bound_attributes: tuple = ('mode', 'name')
+    _bound_methods: tuple = _delegated_methods
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._bound_attributes = tuple(
+            k for k in ('mode', 'name') if not hasattr(cls, k))
+        cls._bound_methods = tuple(
+            k for k in cls._delegated_methods if not hasattr(cls, k))
 
     @classmethod
     def open(cls, file, mode='r', *args, **kwargs):
         k = file, mode
         f = cls._preopened.get(k)
-        if f is None:
-            f = open(file, mode, *args, **kwargs)
-            cls.all_opened_files[id(f)] = f
-        return cls(f)
+        if f is not None:
+            return cls(f)
+        inst = cls(open(file, mode, *args, **kwargs))
+        inst._owns = True
+        return inst
 
     @classmethod
     def wrap(cls, content):
@@ -42,38 +79,82 @@ class Stream(object):
 
     def __init__(self, file):
         self.file = file
+        for name in self._bound_attributes:
+            setattr(self, name, getattr(file, name, None))
+        for name in self._bound_methods:
+            method = getattr(file, name, None)
+            if method is not None:
+                setattr(self, name, method)
+        self._binary = self._check_binary()
 
     def __iter__(self):
         return iter(self.file)
 
+    def _iter_chunks(self, size=65536):
+        read = self.file.read
+        chunk = read(size)
+        while chunk:
+            yield chunk
+            chunk = read(size)
+
+    def _iter_batches(self, size=65536):
+        """
+        Iterate over lists of lines split from large chunks read from the
+        file. Unlike `iter(file)`, line endings are dropped.
+        """
+        if not self.is_binary():
+            # text files split lines by their own newline rules,
+            # e.g. also at '\r' if opened with newline=''
+            yield from self._iter_text_batches(size)
+            return
+        for block in _iter_line_blocks(self._iter_chunks(size)):
+            lines = block.split(b'\n')
+            if not lines[-1]:
+                lines.pop()
+            yield lines
+
+    def _iter_text_batches(self, size):
+        readlines = self.file.readlines
+        lines = readlines(size)
+        nl = b'\n' if lines and isinstance(lines[0], bytes) else '\n'
+        while lines:
+            yield [s.rstrip(nl) for s in lines]
+            lines = readlines(size)
+
+    def _iter_lines_buffered(self, size=65536):
+        return itertools.chain.from_iterable(self._iter_batches(size))
+
     def __getattr__(self, name):
-        if name in self._safe_attributes:
-            return getattr(self.file, name, None)
         return getattr(self.file, name)
 
     def __enter__(self):
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        if id(self.file) in self.all_opened_files:
+        if self._owns:
             self.file.__exit__(exc_type, exc_val, exc_tb)
 
-    def is_binary(self):
-        if self.mode:
+    def _check_binary(self):
+        if isinstance(self.mode, str):
             return 'b' in self.mode
         try:
             return isinstance(self.file.read(0), bytes)
         except Exception:
             pass
 
+    def is_binary(self):
+        return self._binary
+
 
 class FilteredStream(Stream):
     def __init__(self, file, *filters):
-        super(FilteredStream, self).__init__(file)
+        super().__init__(file)
         self.filters = list(filters)
 
     def copy(self):
-        return self.__class__(self.file, *self.filters)
+        inst = self.__class__(self.file, *self.filters)
+        inst._owns = self._owns
+        return inst
 
     def _apply_filters(self, line):
         for f in self.filters:
@@ -91,7 +172,7 @@ class FilteredStream(Stream):
     def __iter__(self):
         if self.filters:
             return self._iter_lines()
-        return super(FilteredStream, self).__iter__()
+        return super().__iter__()
 
     def lines(self):
         return list(self)
@@ -1,43 +1,300 @@
 #!/usr/bin/env python3
 # coding: utf-8
 
-from __future__ import unicode_literals, print_function
-
+import functools
+import itertools
+import multiprocessing
 import os
-
+import pickle
+import re
+import shlex
+from typing import Any, Callable, ClassVar, Iterable, List, Optional, Tuple
+
+from joker.stream import _hyperscan, _numba_kernels
+from joker.stream._filtering import (
+    FilterFunc, filter_batches as _filter_batches,
+    filter_lines as _filter_lines, is_total as _is_total,
+    map_lines as _map_lines,
+)
 from joker.stream.base import FilteredStream, GeneralStream
 
 
-def _grep(line, pattern, flags=0, group=None):
-    import re
-    mat = re.search(pattern, line, flags)
-    if group:
-        return mat and mat.group(group)
-    return mat and line
+class _Filter(object):
+    """
+    Base of picklable filters.
 
+    `args` are the arguments to __init__, by default the values of
+    __slots__ in order; classes with derived slots override it.
+    If `fusion` is set, it is the source of an equivalent statement,
+    in which `s` is the line and {0}, {1}, ... refer to the arguments.
+    `is_total` is True if the filter never discards a line.
+    """
+    __slots__: ClassVar[Tuple[str, ...]] = ()
+    fusion: ClassVar[Optional[str]] = None
+    is_total: ClassVar[bool] = False
 
-def _ungrep(line, pattern, flags=0):
-    import re
-    if re.search(pattern, line, flags) is None:
-        return line
+    @property
+    def args(self) -> tuple:
+        return tuple(getattr(self, k) for k in self.__slots__)
+
+    def __reduce__(self):
+        return self.__class__, self.args
+
+
+class _Snl(_Filter):
+    __slots__ = ('chars',)
+    fusion = 's = s.rstrip({0})'
+    is_total = True
+
+    # text files translate line endings to '\n', whatever os.linesep is
+    def __init__(self, chars: Any = '\n'):
+        self.chars = chars
+
+    def __call__(self, line: Any) -> Any:
+        return line.rstrip(self.chars)
+
+
+class _Nonblank(_Filter):
+    __slots__ = ()
+    fusion = 'if not s.strip(): return None'
+
+    def __call__(self, line: Any) -> Any:
+        if line.strip():
+            return line
+        return None
+
+
+class _Strip(_Filter):
+    __slots__ = ('chars',)
+    fusion = 's = s.strip({0})'
+    is_total = True
+
+    def __init__(self, chars: Any = None):
+        self.chars = chars
+
+    def __call__(self, line: Any) -> Any:
+        return line.strip(self.chars)
+
+
+class _Dense(_Filter):
+    __slots__ = ()
+    fusion = 's = s.strip()\nif not s: return None'
+
+    def __call__(self, line: Any) -> Any:
+        return line.strip() or None
 
 
-def _sub(line, pattern, repl, count=0, flags=0):
-    import re
-    s, n = re.sub(pattern, repl, line, count=count, flags=flags)
+class _Replace(_Filter):
+    __slots__ = ('old', 'new')
+    fusion = 's = s.replace({0}, {1})'
+    is_total = True
 
+    def __init__(self, old: Any, new: Any):
+        self.old = old
+        self.new = new
 
-def _split_format(line, fmt, sep=None, maxsplit=-1, flags=None):
-    if flags is None:
-        parts = line.split(sep, maxsplit)
-    else:
-        import re
-        parts = re.split(sep, line, maxsplit=maxsplit, flags=flags)
-    m = max(fmt.count('{'), 8)
-    n = len(parts)
-    if m > n:
-        parts.extend([''] * (m - n))
-    return fmt.format(*parts)
+    def __call__(self, line: Any) -> Any:
+        return line.replace(self.old, self.new)
+
+
+class _Search(_Filter):
+    __slots__ = ('cre', 'search')
+
+    def __init__(self, cre: re.Pattern):
+        self.cre = cre
+        self.search: Callable[[Any], Optional[re.Match]] = cre.search
+
+    @property
+    def args(self) -> tuple:
+        return self.cre,
+
+
+class _GrepLine(_Search):
+    __slots__ = ()
+
+    def __call__(self, line: Any) -> Any:
+        if self.search(line) is not None:
+            return line
+        return None
+
+
+class _GrepGroup(_Search):
+    __slots__ = ('group',)
+
+    def __init__(self, cre: re.Pattern, group: Any):
+        super().__init__(cre)
+        self.group = group
+
+    @property
+    def args(self) -> tuple:
+        return self.cre, self.group
+
+    def __call__(self, line: Any) -> Any:
+        mat = self.search(line)
+        if mat is not None:
+            return mat.group(self.group)
+        return None
+
+
+class _Ungrep(_Search):
+    __slots__ = ()
+
+    def __call__(self, line: Any) -> Any:
+        if self.search(line) is None:
+            return line
+        return None
+
+
+class _Sub(_Filter):
+    __slots__ = ('cre', 'repl', 'count')
+    is_total = True
+
+    def __init__(self, cre: re.Pattern, repl: Any, count: int = 0):
+        self.cre = cre
+        self.repl = repl
+        self.count = count
+
+    def __call__(self, line: Any) -> Any:
+        return self.cre.sub(self.repl, line, self.count)
+
+
+class _Method(_Filter):
+    __slots__ = ('func', 'positional', 'keywords')
+    # methods of str and bytes never return None
+    is_total = True
+
+    def __init__(self, func: Callable, positional: tuple, keywords: dict):
+        self.func = func
+        self.positional = positional
+        self.keywords = keywords
+
+    def __call__(self, line: Any) -> Any:
+        return self.func(line, *self.positional, **self.keywords)
+
+
+class _SplitFormat(_Filter):
+    __slots__ = ('fmt', 'sep', 'maxsplit', 'pad', 'splitter')
+    is_total = True
+
+    def __init__(self, fmt: str, sep: Optional[str] = None,
+                 maxsplit: int = -1, pad: int = 8,
+                 splitter: Optional[re.Pattern] = None):
+        self.fmt = fmt
+        self.sep = sep
+        self.maxsplit = maxsplit
+        self.pad = pad
+        self.splitter = splitter
+
+    def __call__(self, line: Any) -> Any:
+        if self.splitter is None:
+            parts = line.split(self.sep, self.maxsplit)
+        else:
+            parts = self.splitter.split(line, self.maxsplit)
+        n = len(parts)
+        if n < self.pad:
+            parts += [''] * (self.pad - n)
+        return self.fmt.format(*parts)
+
+
+def _fuse(funcs: List[FilterFunc]) -> FilterFunc:
+    """
+    Generate a single function equivalent to a chain of filters.
+
+    Fusible filters are inlined and others are called in turn;
+    a None check follows only those which may discard the line.
+    """
+    shape: List[tuple] = []
+    values: List[Any] = []
+    for f in funcs:
+        if isinstance(f, _Filter) and f.fusion is not None:
+            args = f.args
+            shape.append((type(f), len(args)))
+            values.extend(args)
+        else:
+            shape.append((None, _is_total(f)))
+            values.append(f)
+    fused = _fusion_factory(tuple(shape))(*values)
+    fused.is_total = all(map(_is_total, funcs))
+    return fused
+
+
+@functools.lru_cache(maxsize=256)
+def _fusion_factory(shape: Tuple[tuple, ...]) -> Callable:
+    # source is generated and compiled once for each shape of chain,
+    # i.e. the classes of fusible filters and the totality of others;
+    # the returned factory binds the values of a particular chain
+    names = iter('_a{}'.format(i) for i in itertools.count())
+    params: List[str] = []
+    statements: List[str] = []
+    for cls, info in shape:
+        if cls is not None:
+            args = [next(names) for _ in range(info)]
+            params.extend(args)
+            statements.extend(cls.fusion.format(*args).splitlines())
+            continue
+        name = next(names)
+        params.append(name)
+        statements.append('s = {}(s)'.format(name))
+        if not info:
+            statements.append('if s is None: return None')
+    lines = ['def make({}):'.format(', '.join(params))]
+    lines.append('    def fused(s):')
+    lines.extend('        ' + stmt for stmt in statements)
+    lines.append('        return s')
+    lines.append('    return fused')
+    namespace: dict = {}
+    code = compile('\n'.join(lines), '<fused filters>', 'exec')
+    exec(code, namespace)
+    return namespace['make']
+
+
+def _run_kind(f: FilterFunc) -> Optional[str]:
+    if not isinstance(f, _Filter):
+        return None
+    if f.fusion is not None:
+        return 'fusion'
+    if isinstance(f, (_GrepLine, _Ungrep)):
+        return 'scan'
+    return None
+
+
+def _compile_filters(filters: Iterable[FilterFunc], unroll=True) \
+        -> List[FilterFunc]:
+    """
+    Scan each line once for each run of adjacent grep/ungrep patterns
+    if an optional multi-pattern backend is installed, and then
+    generate a single function equivalent to the whole chain, or
+    if not unroll, one for each run of adjacent fusible filters
+    """
+    compiled: List[FilterFunc] = []
+    for kind, group in itertools.groupby(filters, _run_kind):
+        run: List[Any] = list(group)
+        if len(run) > 1 and kind == 'fusion' and not unroll:
+            compiled.append(_fuse(run))
+            continue
+        if len(run) > 1 and kind == 'scan':
+            tests = [(f.cre, isinstance(f, _GrepLine)) for f in run]
+            scanner = _hyperscan.compile_scanner(tests)
+            if scanner is not None:
+                compiled.append(scanner)
+                continue
+        compiled.extend(run)
+    if unroll and len(compiled) > 1:
+        return [_fuse(compiled)]
+    return compiled
+
+
+# filters of a worker process of ShellStream.lines_parallel()
+_worker_filters: List[FilterFunc] = []
+
+
+def _init_worker(filters: List[FilterFunc]):
+    global _worker_filters
+    _worker_filters = _compile_filters(filters)
+
+
+def _run_filters(chunk: List[Any]) -> List[Any]:
+    return list(_filter_lines(_worker_filters, chunk))
 
 
 def safe_bracket(x, i, default=None):
@@ -48,59 +305,149 @@ def safe_bracket(x, i, default=None):
 
 
 class ShellStream(FilteredStream):
+    filters: List[FilterFunc]
+
+    def _compile_filters(self, filters=None):
+        if filters is None:
+            filters = self.filters
+        return _compile_filters(filters)
+
+    def _is_seekable(self):
+        try:
+            return self.file.seekable()
+        except AttributeError:
+            return False
+
+    def _size_hint(self):
+        # bytes left to read, or 0 if unknown
+        try:
+            return os.fstat(self.file.fileno()).st_size - self.file.tell()
+        except (AttributeError, OSError, ValueError):
+            return 0
+
+    def _is_bufferable(self):
+        # a leading snl() is done by splitting large chunks on newlines;
+        # pipes and terminals are left to line-by-line reading,
+        # so that each line is processed as soon as it is available
+        return isinstance(self.filters[0], _Snl) and self._is_seekable()
+
+    def _source_and_filters(self):
+        if self._is_bufferable():
+            return self._iter_lines_buffered(), self.filters[1:]
+        return self.file, self.filters
+
+    def _iter_lines(self):
+        if not self._is_bufferable():
+            filters = _compile_filters(self.filters)
+            if all(map(_is_total, filters)):
+                return _map_lines(filters, self.file)
+            return _filter_lines(filters, self.file)
+        filters = self.filters[1:]
+        if filters and isinstance(filters[0], _Nonblank) \
+                and self.is_binary() \
+                and self._size_hint() >= _numba_kernels.MIN_SIZE \
+                and _numba_kernels.is_available():
+            chunks = self._iter_chunks(1 << 20)
+            batches = _numba_kernels.iter_nonblank_batches(chunks)
+            filters = filters[1:]
+        else:
+            batches = self._iter_batches()
+        lines = itertools.chain.from_iterable(batches)
+        if all(map(_is_total, filters)):
+            return _map_lines(_compile_filters(filters), lines)
+        # builtin filters have no side effects, so each of them can be
+        # applied to a whole batch of lines before the next one
+        if all(isinstance(f, _Filter) for f in self.filters):
+            filters = _compile_filters(filters, unroll=False)
+            return _filter_batches(filters, batches)
+        return _filter_lines(_compile_filters(filters), lines)
+
+    def lines_parallel(self, workers=None, chunksize=1024):
+        """
+        Like lines(), but filters are applied in a pool of processes,
+        each given `chunksize` lines at a time; order is preserved.
+        Fall back to lines() if the filters cannot be pickled.
+        """
+        if not self.filters:
+            return self.lines()
+        lines, filters = self._source_and_filters()
+        try:
+            pickle.dumps(filters)
+        except (pickle.PicklingError, AttributeError, TypeError):
+            return self.lines()
+        lines = iter(lines)
+        chunks = iter(lambda: list(itertools.islice(lines, chunksize)), [])
+        with multiprocessing.Pool(workers, _init_worker, (filters,)) as pool:
+            results = pool.imap(_run_filters, chunks)
+            return list(itertools.chain.from_iterable(results))
+
     def snl(self, extra_func=None):
-        """strip trailing newline charactors (linesep)"""
-        self.filters.append(lambda s: s.rstrip(os.linesep))
+        """strip trailing newline charactors"""
+        self.filters.append(_Snl(b'\n' if self.is_binary() else '\n'))
         if extra_func is not None:
             self.filters.append(extra_func)
         return self
 
     def sf(self, fmt, sep=None, maxsplit=-1, flags=None):
         """split and format"""
-        _sf = _split_format
-        self.filters.append(lambda s: _sf(s, fmt, sep, maxsplit, flags))
+        pad = max(fmt.count('{'), 8)
+        if flags is None:
+            splitter = None
+        else:
+            splitter = re.compile(sep, flags)
+            maxsplit = max(maxsplit, 0)
+        self.filters.append(_SplitFormat(fmt, sep, maxsplit, pad, splitter))
         return self
 
     def nonblank(self):
         """discard lines containing only spaces"""
-        self.filters.append(lambda s: (s if s.strip() else None))
+        self.filters.append(_Nonblank())
         return self
 
     def strip(self, chars=None):
         """strip leading and trailing spaces or specified characters"""
-        self.filters.append(lambda s: s.strip(chars))
+        self.filters.append(_Strip(chars))
         return self
 
     def dense(self):
         """strip and discard empty strings"""
-        self.filters.append(lambda s: (s.strip() or None))
+        self.filters.append(_Dense())
         return self
 
     def replace(self, old, new):
-        self.filters.append(lambda s: s.replace(old, new))
+        self.filters.append(_Replace(old, new))
         return self
 
     def method(self, name, *args, **kwargs):
-        self.filters.append(lambda s: getattr(name, *args, **kwargs))
+        """call a method of str (or bytes) on each line"""
+        func = getattr(bytes if self.is_binary() else str, name)
+        self.filters.append(_Method(func, args, kwargs))
         return self
 
     def ungrep(self, pattern, flags=0):
-        self.filters.append(lambda line: _ungrep(line, pattern, flags))
+        cre = re.compile(pattern, flags)
+        self.filters.append(_Ungrep(cre))
         return self
 
     def grep(self, pattern, flags=0, group=None):
-        self.filters.append(lambda line: _grep(line, pattern, flags, group))
+        cre = re.compile(pattern, flags)
+        if group:
+            self.filters.append(_GrepGroup(cre, group))
+        else:
+            self.filters.append(_GrepLine(cre))
         return self
 
-    def sub(self, pattern):
-        pass
+    def sub(self, pattern, repl, count=0, flags=0):
+        """replace occurrences of pattern as re.sub() does"""
+        cre = re.compile(pattern, flags)
+        self.filters.append(_Sub(cre, repl, count))
+        return self
 
     def quote(self, strip=True):
         if self.is_binary():
             raise TypeError('file should be opened in text mode')
         if strip:
             self.strip()
-        import shlex
         return self.add_filters(shlex.quote)
 
     def __getitem__(self, idx):
@@ -108,8 +455,7 @@ class ShellStream(FilteredStream):
             self.filters.append(lambda line: line.split()[idx])
         if isinstance(idx, str):
             idx = int(idx)
-            from shlex import split
-            self.filters.append(lambda line: split(line)[idx])
+            self.filters.append(lambda line: shlex.split(line)[idx])
         return self
 
     def nthcol(self, idx):
@@ -120,15 +466,17 @@ class ShellStream(FilteredStream):
             )
         if isinstance(idx, str):
             idx = int(idx)
-            from shlex import split
             self.filters.append(
-                lambda line: safe_bracket(split(line), idx, default)
+                lambda line: safe_bracket(shlex.split(line), idx, default)
             )
         return self
 
 
 class GeneralShellStream(GeneralStream, ShellStream):
-    pass
+    def lines_parallel(self, workers=None, chunksize=1024):
+        # filters of a general stream may expand a line into many;
+        # they are applied serially
+        return self.lines()
 
 
 class RecursiveInclusionStream(GeneralStream):
@@ -146,7 +494,6 @@ class RecursiveInclusionStream(GeneralStream):
 
     @staticmethod
     def check_for_inclusion(line):
-        import shlex
         parts = shlex.split(line, comments=True)
         if len(parts) == 2 and parts[0] in ['.', 'source']:
             path = parts[1]
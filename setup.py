@@ -50,15 +50,17 @@ config = {
     'license': "GNU General Public License (GPL)",
     'packages': find_namespace_packages(include=['joker.*']),
     'zip_safe': False,
+    'python_requires': '>=3.7',
     'install_requires': read("requirements.txt"),
+    'extras_require': {
+        'hyperscan': ['hyperscan'],
+        'numba': ['numba'],
+        'mypyc': ['mypy[mypyc]'],
+        're2': ['google-re2'],
+    },
     'classifiers': [
         'Programming Language :: Python',
-        'Programming Language :: Python :: 2',
-        'Programming Language :: Python :: 2.7',
         'Programming Language :: Python :: 3',
-        'Programming Language :: Python :: 3.4',
-        'Programming Language :: Python :: 3.5',
-        'Programming Language :: Python :: 3.6',
         'Programming Language :: Python :: 3.7',
         'Programming Language :: Python :: 3.8',
         'Programming Language :: Python :: 3.9',
@@ -73,6 +75,14 @@ config = {
 if _nsp:
     config['namespace_packages'] = [_nsp]
 
+# compile the filter dispatch loops to a C extension with mypyc:
+#   JOKER_STREAM_MYPYC=1 pip install --no-build-isolation .
+if os.environ.get('JOKER_STREAM_MYPYC'):
+    from mypyc.build import mypycify
+    config['ext_modules'] = mypycify([
+        '--explicit-package-bases', 'joker/stream/_filtering.py',
+    ])
+
 
 setup(**config)
 
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+import io
+import os
+import tempfile
+
+from joker.stream.base import Stream
+
+
+def test_owned_file_closed():
+    fd, path = tempfile.mkstemp()
+    os.close(fd)
+    try:
+        with Stream.open(path) as sm:
+            assert not sm.file.closed
+        assert sm.file.closed
+    finally:
+        os.remove(path)
+
+
+def test_preopened_file_kept_open():
+    stdin = Stream._preopened['-', 'r']
+    # a stand-in for sys.stdin, which may be replaced by the test runner
+    fin = io.StringIO('a\n')
+    Stream._preopened['-', 'r'] = fin
+    try:
+        with Stream.open('-') as sm:
+            assert sm.file is fin
+        assert not fin.closed
+    finally:
+        Stream._preopened['-', 'r'] = stdin
+
+
+def test_caller_file_kept_open():
+    fin = io.StringIO('a\n')
+    with Stream(fin) as sm:
+        assert sm.read() == 'a\n'
+    assert not fin.closed
+
+
+if __name__ == '__main__':
+    test_owned_file_closed()
+    test_preopened_file_kept_open()
+    test_caller_file_kept_open()
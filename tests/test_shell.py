@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+import gzip
+import io
+import os
+import pickle
+import re
+import tempfile
+
+import pytest
+
+from joker.stream import _hyperscan, _numba_kernels
+from joker.stream.shell import ShellStream
+
+_text = 'alpha 1\nbeta 2\n\n  gamma 3  \nALPHA 4\n'
+
+
+def test_grep():
+    lines = ShellStream.wrap(_text).snl().grep('alpha').lines()
+    assert lines == ['alpha 1']
+    lines = ShellStream.wrap(_text).snl().grep('alpha', re.I).lines()
+    assert lines == ['alpha 1', 'ALPHA 4']
+    lines = ShellStream.wrap(_text).grep(r'(\w+) (\d)', group=2).lines()
+    assert lines == ['1', '2', '3', '4']
+    lines = ShellStream.wrap(_text).snl().ungrep('a').lines()
+    assert lines == ['', 'ALPHA 4']
+
+
+def test_sub():
+    lines = ShellStream.wrap(_text).snl().sub(r'(\w+) (\d)', r'\2:\1').lines()
+    assert lines == ['1:alpha', '2:beta', '', '  3:gamma  ', '4:ALPHA']
+    lines = ShellStream.wrap('aAa\n').snl().sub('a', '-', 2, re.I).lines()
+    assert lines == ['--a']
+
+
+def test_method():
+    lines = ShellStream.wrap(_text).snl().method('rjust', 8, '.').lines()
+    assert lines[:3] == ['.alpha 1', '..beta 2', '........']
+    stream = ShellStream.wrap(b'a-b\n').snl().method('replace', b'-', b'+')
+    assert stream.lines() == [b'a+b']
+
+
+def test_sf():
+    lines = ShellStream.wrap('a:b:c\n').snl().sf('{2}-{0}', ':').lines()
+    assert lines == ['c-a']
+    lines = ShellStream.wrap('a1b2c\n').snl().sf('{1}{2}', r'\d', 1, 0).lines()
+    assert lines == ['b2c']
+
+
+def test_fused_filters():
+    stream = ShellStream.wrap(_text).snl().nonblank().strip().replace('a', 'o')
+    assert len(stream._compile_filters()) == 1
+    assert stream.lines() == ['olpho 1', 'beto 2', 'gommo 3', 'ALPHA 4']
+    stream = ShellStream.wrap(_text).dense().grep('a').strip('a3 ')
+    assert len(stream._compile_filters()) == 1
+    assert stream.lines() == ['lpha 1', 'beta 2', 'gamm']
+    # chains of the same shape share generated code, not arguments
+    stream = ShellStream.wrap(_text).dense().grep('a').strip('1 ')
+    assert stream.lines() == ['alpha', 'beta 2', 'gamma 3']
+
+
+def test_buffered_snl():
+    lines = ShellStream.wrap(_text).snl().lines()
+    assert lines == _text.splitlines()
+    lines = ShellStream(iter(_text.splitlines(True))).snl().lines()
+    assert lines == _text.splitlines()
+    assert ShellStream.wrap('a\n\nb').snl().lines() == ['a', '', 'b']
+    assert ShellStream.wrap(b'a\nb\n').snl().lines() == [b'a', b'b']
+    # iter(file) also splits at '\r' if newline=''
+    fin = io.StringIO('a\rb\r\nc\n', newline='')
+    assert ShellStream(fin).snl().lines() == ['a\r', 'b\r', 'c']
+    stream = ShellStream.wrap(b'a\n \t\n\nb').snl().nonblank()
+    assert stream.lines() == [b'a', b'b']
+    rfd, wfd = os.pipe()
+    os.write(wfd, b'a\nb')
+    os.close(wfd)
+    with open(rfd, 'rb') as fin:
+        assert ShellStream(fin).snl().lines() == [b'a', b'b']
+    stream = ShellStream.wrap(_text).snl().add_filters(lambda s: s[::-1])
+    assert stream.grep(r'^\d').lines() == ['1 ahpla', '2 ateb', '4 AHPLA']
+
+
+def test_pickle_filters():
+    stream = ShellStream.wrap(_text).snl().dense().grep(r'(\w+) 3', group=1)
+    stream.replace('m', 'n').sf('<{0}>', 'n', flags=0)
+    filters = pickle.loads(pickle.dumps(stream.filters))
+    assert ShellStream.wrap(_text).add_filters(*filters).lines() == ['<ga>']
+
+
+def test_lines_parallel():
+    stream = ShellStream.wrap(_text * 100).snl().dense().grep('a')
+    expected = ['alpha 1', 'beta 2', 'gamma 3'] * 100
+    assert stream.lines_parallel(2, 7) == expected
+    stream = ShellStream.wrap(_text).add_filters(lambda s: s.upper())
+    assert stream.lines_parallel(2) == _text.upper().splitlines(True)
+
+
+def test_gzip_file():
+    # GzipFile.mode is an int, not a mode string
+    data = gzip.compress(_text.encode('utf-8'))
+    sm = ShellStream(gzip.GzipFile(fileobj=io.BytesIO(data)))
+    assert sm.is_binary()
+    assert sm.strip().lines() == [
+        b'alpha 1', b'beta 2', b'', b'gamma 3', b'ALPHA 4',
+    ]
+
+
+def test_subclass_override():
+    class UpperStream(ShellStream):
+        def write(self, s):
+            return self.file.write(s.upper())
+
+    sm = UpperStream.wrap('')
+    sm.write('abc\n')
+    assert sm.getvalue() == 'ABC\n'
+
+    class NamedStream(ShellStream):
+        @property
+        def name(self):
+            return 'named'
+
+    sm = NamedStream.wrap('a\n')
+    assert sm.name == 'named'
+    assert sm.snl().lines() == ['a']
+
+
+def test_numba_nonblank():
+    if not _numba_kernels.is_available():
+        pytest.skip('numba is not installed')
+    data = b'a\n \t\n\nb \n' * 1000 + b'c'
+    expected = [s for s in data.split(b'\n') if s.strip()]
+    chunks = [data[i:i + 7] for i in range(0, len(data), 7)]
+    batches = _numba_kernels.iter_nonblank_batches(chunks)
+    assert [s for batch in batches for s in batch] == expected
+    min_size = _numba_kernels.MIN_SIZE
+    _numba_kernels.MIN_SIZE = 0
+    try:
+        with tempfile.TemporaryFile() as fin:
+            fin.write(data)
+            fin.seek(0)
+            assert ShellStream(fin).snl().nonblank().lines() == expected
+    finally:
+        _numba_kernels.MIN_SIZE = min_size
+
+
+_scan_text = 'ab\nab \n\nx\n\u0663 x\n\u00e9\u00e9\nB 9\nzz\np:]\nb\n'
+# a lone surrogate, as decoded with errors='surrogateescape'
+_scan_text += '\udcffx\n\udcffab\n'
+
+# runs of grep (True) and ungrep (False) tests long enough for a backend
+_scan_runs = [
+    [(r'b\Z', 0, True), ('x', 0, False), ('y', 0, False), ('q', 0, False)],
+    [(r'\w', 0, True), (r'\d', 0, False), ('q', 0, False), ('y', 0, False)],
+    [(r'\bx', 0, False), (r'\s', 0, False), ('y', 0, False), ('q', 0, False)],
+    [('a', 0, True), ('B', re.I, True), ('x', 0, False), ('zz', 0, False)],
+    [('^a', 0, False), ('\u00e9', 0, False), ('9', 0, False), ('q', 0, False)],
+    # re reads {,n} as 0 to n repeats and [:alpha:] as part of a set
+    [('a{,2}b', 0, True), ('q1', 0, False), ('q2', 0, False),
+     ('q3', 0, False)],
+    [('[p[:alpha:]]', 0, True), ('1', 0, False), ('2', 0, False),
+     ('3', 0, False)],
+]
+
+
+def _scan(backend, run, snl):
+    _hyperscan._load_backends()
+    _hyperscan._compile_scanner.cache_clear()
+    saved = _hyperscan.hyperscan, _hyperscan.re2
+    if backend != 'hyperscan':
+        _hyperscan.hyperscan = None
+    if backend != 're2':
+        _hyperscan.re2 = None
+    try:
+        tests = [(re.compile(p, f), positive) for p, f, positive in run]
+        scanned = _hyperscan.compile_scanner(tests) is not None
+        stream = ShellStream.wrap(_scan_text)
+        if snl:
+            stream.snl()
+        for pattern, flags, positive in run:
+            if positive:
+                stream.grep(pattern, flags)
+            else:
+                stream.ungrep(pattern, flags)
+        return stream.lines(), scanned
+    finally:
+        _hyperscan.hyperscan, _hyperscan.re2 = saved
+        _hyperscan._compile_scanner.cache_clear()
+
+
+def _check_scanner_backend(backend):
+    _hyperscan._load_backends()
+    if getattr(_hyperscan, backend) is None:
+        pytest.skip('{} is not installed'.format(backend))
+    for run in _scan_runs:
+        for snl in (False, True):
+            expected, _ = _scan(None, run, snl)
+            lines, scanned = _scan(backend, run, snl)
+            assert lines == expected, (backend, run, snl)
+    # runs which the backend is expected to take
+    assert _scan(backend, _scan_runs[3], False)[1]
+    assert _scan(backend, _scan_runs[4], False)[1]
+    # a scanner is compiled once for each run of patterns
+    tests = [(re.compile(p, f), positive) for p, f, positive in _scan_runs[3]]
+    scanner = _hyperscan.compile_scanner(tests)
+    assert scanner is not None
+    assert _hyperscan.compile_scanner(tests) is scanner
+
+
+def test_hyperscan_scanner():
+    _check_scanner_backend('hyperscan')
+
+
+def test_re2_scanner():
+    _check_scanner_backend('re2')
+
+
+if __name__ == '__main__':
+    test_grep()
+    test_sub()
+    test_method()
+    test_sf()
+    test_fused_filters()
+    test_buffered_snl()
+    test_pickle_filters()
+    test_lines_parallel()
+    test_gzip_file()
+    test_subclass_override()
+    test_numba_nonblank()
+    test_hyperscan_scanner()
+    test_re2_scanner()